@@ -1,21 +1,87 @@
-from sklearn.base import BaseEstimator, TransformerMixin
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin, clone
 
 import src.transformations.listings as listings_transforms
 import src.transformations.sessions as sessions_transforms
+from src.transformations.dtypes import compact_dtypes
+
+SESSIONS_CACHE_SIZE = 4
+# Maps id(sessions) to (weak reference, session features). The weak reference
+# guards against a reused id after the frame is freed. Entries are keyed on the
+# frame object, so refresh() is the way to pick up in-place edits.
+_sessions_cache = OrderedDict()
+_sessions_cache_lock = threading.Lock()
+
+
+def _session_features(sessions, refresh: bool = False) -> pd.DataFrame:
+    key = id(sessions)
+    with _sessions_cache_lock:
+        entry = _sessions_cache.get(key)
+        if not refresh and entry is not None and entry[0]() is sessions:
+            _sessions_cache.move_to_end(key)
+            return entry[1]
+
+    features = sessions_transforms.transform_pipeline(sessions)
+    features = features.set_index("listing_id")
+    with _sessions_cache_lock:
+        _sessions_cache[key] = (weakref.ref(sessions), features)
+        _sessions_cache.move_to_end(key)
+        if len(_sessions_cache) > SESSIONS_CACHE_SIZE:
+            _sessions_cache.popitem(last=False)
+    return features
 
 
 class FeatureBuilder(BaseEstimator, TransformerMixin):
-    def __init__(self, sessions):
+    def __init__(
+        self, sessions, sentiment_engine=None, feature_store=None, compact=False
+    ):
         self.sessions = sessions
+        self.sentiment_engine = sentiment_engine
+        self.feature_store = feature_store
+        self.compact = compact
+
+    def __sklearn_clone__(self):
+        # Clones share the sessions frame instead of deep-copying it, so every
+        # search candidate finds its features in the cache.
+        params = {
+            name: value if name == "sessions" else clone(value, safe=False)
+            for name, value in self.get_params(deep=False).items()
+        }
+        return type(self)(**params)
 
     def fit(self, X, y=None):
+        self.sessions_features_ = _session_features(self.sessions)
+        return self
+
+    def refresh(self, sessions=None):
+        if sessions is not None:
+            self.sessions = sessions
+        self.sessions_features_ = _session_features(self.sessions, refresh=True)
         return self
 
     def transform(self, X):
-        listings_features = listings_transforms.transform_pipeline(X)
-        sessions_features = sessions_transforms.transform_pipeline(self.sessions)
+        if not hasattr(self, "sessions_features_"):
+            self.sessions_features_ = _session_features(self.sessions)
+
+        if self.feature_store is not None:
+            listings_features = self.feature_store.transform(X, self.sentiment_engine)
+        else:
+            listings_features = listings_transforms.transform_pipeline(
+                X, self.sentiment_engine
+            )
+        sessions_features = self.sessions_features_.reindex(listings_features["id"])
 
-        features = listings_features.merge(
-            sessions_features, left_on="id", right_on="listing_id", how="left"
+        features = pd.concat(
+            [
+                listings_features.drop(columns="id").reset_index(drop=True),
+                sessions_features.reset_index(drop=True),
+            ],
+            axis=1,
         )
-        return features.drop(columns=["listing_id", "id"])
+        if self.compact:
+            return compact_dtypes(features)
+        return features
@@ -1,4 +1,6 @@
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
@@ -7,16 +9,31 @@ from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
 
 
 class Preprocessor(BaseEstimator, TransformerMixin):
-    def __init__(self):
+    def __init__(self, dtype=None, sparse_ohe=False):
         self.transformer = None
+        self.dtype = dtype
+        self.sparse_ohe = sparse_ohe
+
+    def __setstate__(self, state):
+        state.setdefault("dtype", None)
+        state.setdefault("sparse_ohe", False)
+        super().__setstate__(state)
+        if self.transformer is not None and not hasattr(self, "blocks_"):
+            self._record_schema()
+
+    def _cast(self, X):
+        if self.dtype is None:
+            return X
+        numeric_columns = X.select_dtypes(include=["number", "bool"]).columns
+        return X.astype({col: self.dtype for col in numeric_columns})
 
     def fit(self, X, y=None):
-        binary_cols = [
-            col
-            for col in X.columns
-            if X[col].dropna().nunique() <= 2
-            and set(X[col].dropna().unique()).issubset({0, 1})
-        ]
+        X = self._cast(X)
+        encoded_dtype = self.dtype or np.float64
+        numeric = X.select_dtypes(include=["number", "bool"])
+        values = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+        is_binary = (np.isnan(values) | (values == 0) | (values == 1)).all(axis=0)
+        binary_cols = numeric.columns[is_binary].tolist()
         zero_columns = ["average_lead_time", "average_booking_duration"]
         num_columns = (
             X.select_dtypes(include=["number"])
@@ -55,7 +72,12 @@ class Preprocessor(BaseEstimator, TransformerMixin):
                     Pipeline(
                         [
                             ("imputer", SimpleImputer(strategy="most_frequent")),
-                            ("ohe", OneHotEncoder(handle_unknown="ignore")),
+                            (
+                                "ohe",
+                                OneHotEncoder(
+                                    handle_unknown="ignore", dtype=encoded_dtype
+                                ),
+                            ),
                         ]
                     ),
                     ohe_columns,
@@ -78,6 +100,7 @@ class Preprocessor(BaseEstimator, TransformerMixin):
                                     ],
                                     handle_unknown="use_encoded_value",
                                     unknown_value=-1,
+                                    dtype=encoded_dtype,
                                 ),
                             ),
                         ]
@@ -88,13 +111,61 @@ class Preprocessor(BaseEstimator, TransformerMixin):
             remainder="drop",
         )
         self.transformer.fit(X)
+        self._record_schema()
         return self
 
-    def transform(self, X):
+    def _record_schema(self):
+        self.feature_names_in_ = self.transformer.feature_names_in_
+        self.feature_names_out_ = self.transformer.get_feature_names_out()
+        self.blocks_ = []
+        for name, transformer, columns in self.transformer.transformers_:
+            indices = self.transformer.output_indices_[name]
+            if transformer == "drop" or indices.start == indices.stop:
+                continue
+
+            statistics = None
+            if len(transformer.steps) == 1:
+                statistics = transformer.steps[0][1].statistics_.astype(np.float64)
+                keep = ~np.isnan(statistics)
+                columns = [col for col, kept in zip(columns, keep) if kept]
+                statistics = statistics[keep]
+            self.blocks_.append((transformer, columns, indices, statistics))
+
+    def _transform_block(self, X, transformer, columns, statistics, dtype):
+        if statistics is None:
+            return transformer.transform(X[columns])
+        block = X[columns].to_numpy(dtype=dtype, na_value=np.nan, copy=True)
+        np.copyto(block, statistics.astype(dtype), where=np.isnan(block))
+        return block
+
+    def transform_array(self, X, out=None):
         if self.transformer is None:
             raise RuntimeError("Use fit before transform")
-        features_array = self.transformer.transform(X)
-        features_names = self.transformer.get_feature_names_out()
-        features = pd.DataFrame(features_array, columns=features_names, index=X.index)
+        X = self._cast(X)
+        dtype = self.dtype or np.float64
+
+        if self.sparse_ohe:
+            if out is not None:
+                raise ValueError("out is not supported with sparse_ohe")
+            blocks = [
+                self._transform_block(X, transformer, columns, statistics, dtype)
+                for transformer, columns, _, statistics in self.blocks_
+            ]
+            return sparse.hstack(blocks, format="csr", dtype=dtype)
 
-        return features
+        if out is None:
+            out = np.empty((len(X), len(self.feature_names_out_)), dtype=dtype)
+        for transformer, columns, indices, statistics in self.blocks_:
+            block = self._transform_block(X, transformer, columns, statistics, dtype)
+            out[:, indices] = block.toarray() if sparse.issparse(block) else block
+        return out
+
+    def transform(self, X):
+        features_array = self.transform_array(X)
+        if sparse.issparse(features_array):
+            return pd.DataFrame.sparse.from_spmatrix(
+                features_array, index=X.index, columns=self.feature_names_out_
+            )
+        return pd.DataFrame(
+            features_array, columns=self.feature_names_out_, index=X.index
+        )
@@ -1,51 +1,86 @@
+import re
+import threading
+from collections import OrderedDict
+
+import joblib
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.utils.validation import check_memory
+
+SELECTION_CACHE_SIZE = 32
+# Maps joblib hashes of (estimator, X, y) to feature importances. Only the
+# importances are kept, so entries stay small and no fitted estimator is shared
+# between selectors. The cache is per process; pass memory= to reuse fits across
+# GridSearchCV workers or sessions.
+_importances_cache = OrderedDict()
+_importances_cache_lock = threading.Lock()
+
+
+def _fit_importances(estimator, X, y) -> pd.Series:
+    estimator = clone(estimator)
+    estimator.fit(X, y)
+    return pd.Series(estimator.feature_importances_, index=X.columns.tolist())
+
+
+def _select_features(importances: pd.Series, percent, ohe_features) -> list[str]:
+    feature_names = importances.index.tolist()
+    prefixes = re.compile(
+        "|".join(re.escape("ohe__" + feature) for feature in ohe_features) or "(?!)"
+    )
+    groups = {}
+    for col in feature_names:
+        matched = prefixes.match(col)
+        groups.setdefault(matched.group() if matched else col, []).append(col)
+
+    group_importances = {g: importances[col].sum() for g, col in groups.items()}
+
+    sorted_group_importances = {
+        k: v
+        for k, v in sorted(
+            group_importances.items(), key=lambda item: item[1], reverse=True
+        )
+    }
+
+    selected_groups = {}
+    for g, v in sorted_group_importances.items():
+        if (len(selected_groups.keys()) / len(group_importances.keys())) < percent:
+            selected_groups[g] = v
+
+    return [col for g in selected_groups for col in groups[g]]
 
 
 class FeatureSelector(BaseEstimator, TransformerMixin):
-    def __init__(self, estimator, percent, ohe_features):
+    def __init__(self, estimator, percent, ohe_features, memory=None):
         self.estimator = estimator
         self.percent = percent
         self.ohe_features = ohe_features
+        self.memory = memory
+
+    def __setstate__(self, state):
+        state.setdefault("memory", None)
+        super().__setstate__(state)
 
     def fit(self, X, y):
-        self.estimator_ = clone(self.estimator)
-        self.estimator_.fit(X, y)
+        args = (self.estimator, X, y)
+        key = joblib.hash(args)
 
-        feature_names = X.columns.tolist()
-        importances = pd.Series(
-            self.estimator_.feature_importances_, index=feature_names
-        )
+        with _importances_cache_lock:
+            importances = _importances_cache.get(key)
+            if importances is not None:
+                _importances_cache.move_to_end(key)
+
+        if importances is None:
+            importances = check_memory(self.memory).cache(_fit_importances)(*args)
+            with _importances_cache_lock:
+                _importances_cache[key] = importances
+                _importances_cache.move_to_end(key)
+                if len(_importances_cache) > SELECTION_CACHE_SIZE:
+                    _importances_cache.popitem(last=False)
 
-        groups = {}
-        for col in feature_names:
-            matched = False
-            for feature in self.ohe_features:
-                prefix = "ohe__" + feature
-                if col.startswith(prefix):
-                    groups.setdefault(prefix, []).append(col)
-                    matched = True
-                    break
-            if not matched:
-                groups[col] = [col]
-
-        group_importances = {g: importances[col].sum() for g, col in groups.items()}
-
-        sorted_group_importances = {
-            k: v
-            for k, v in sorted(
-                group_importances.items(), key=lambda item: item[1], reverse=True
-            )
-        }
-
-        selected_groups = {}
-        for g, v in sorted_group_importances.items():
-            if (
-                len(selected_groups.keys()) / len(group_importances.keys())
-            ) < self.percent:
-                selected_groups[g] = v
-
-        self.selected_features_ = [col for g in selected_groups for col in groups[g]]
+        self.feature_importances_ = importances.copy()
+        self.selected_features_ = _select_features(
+            importances, self.percent, list(self.ohe_features)
+        )
         return self
 
     def transform(self, X):
@@ -1,44 +1,393 @@
+import asyncio
+import logging
+import os
 import random
+import threading
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
+from functools import partial
 
 import joblib
 import pandas as pd
 import uvicorn
-from fastapi import FastAPI
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
 
-from src.service.logger import CSVLogger
+from src.service.batching import MicroBatcher
+from src.service.cache import PredictionCache
+from src.service.compiled import compile_linear_pipeline
+from src.service.logger import BufferedCSVLogger, CSVLogger
+from src.service.metrics import MetricsRegistry
 from src.service.model import PredictionData
+from src.service.store import load_shared
 
-csv_logger = CSVLogger(
-    "./logs/service.log", ["level", "timestamp", "model", "prediction", "real"]
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "./logs/service.log"
+SHADOW_MODE = os.getenv("SHADOW_MODE", "0") != "0"
+LOG_FIELDS = ["level", "timestamp", "model", "prediction", "real"]
+if SHADOW_MODE:
+    LOG_FIELDS.append("shadow")
+LOG_BUFFERED = os.getenv("LOG_BUFFERED", "1") != "0"
+
+if LOG_BUFFERED:
+    csv_logger = BufferedCSVLogger(
+        LOG_FILE,
+        LOG_FIELDS,
+        max_queue_size=int(os.getenv("LOG_MAX_QUEUE_SIZE", "10000")),
+        on_full=os.getenv("LOG_ON_FULL", "block"),
+        fsync_interval=float(os.getenv("LOG_FSYNC_INTERVAL", "5.0")),
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", "0")) or None,
+        rotate_interval=float(os.getenv("LOG_ROTATE_INTERVAL", "0")) or None,
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+    )
+else:
+    csv_logger = CSVLogger(LOG_FILE, LOG_FIELDS)
+
+MODEL_STORE = os.getenv("MODEL_STORE")
+FAST_LINEAR = os.getenv("FAST_LINEAR", "1") != "0"
+ADVANCED_MODEL_FILE = os.getenv("ADVANCED_MODEL_FILE", "forest_pipeline.joblib")
+
+
+def _load_model(filename: str):
+    if MODEL_STORE:
+        return load_shared(os.path.join(MODEL_STORE, filename))
+    return joblib.load(os.path.join("./models", filename))
+
+
+MODEL_FILES = {"base": "linear_pipeline.joblib", "advanced": ADVANCED_MODEL_FILE}
+MODELS = {}
+MODEL_VERSIONS = {}
+
+prediction_cache = PredictionCache(
+    max_size=int(os.getenv("PREDICTION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL", "300")),
 )
 
-BASE_MODEL = joblib.load("./models/linear_pipeline.joblib")
-ADVANCED_MODEL = joblib.load("./models/forest_pipeline.joblib")
 
-app = FastAPI()
+def _model_version(filename: str) -> str:
+    stat = os.stat(os.path.join(MODEL_STORE or "./models", filename))
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
 
 
-@app.post("/predict")
-async def predict_price(data: PredictionData):
+def load_models() -> None:
+    models = {name: _load_model(filename) for name, filename in MODEL_FILES.items()}
+    if FAST_LINEAR:
+        try:
+            models["base"] = compile_linear_pipeline(models["base"])
+        except ValueError as error:
+            logger.warning("Serving the base pipeline uncompiled: %s", error)
+
+    MODELS.update(models)
+    MODEL_VERSIONS.update(
+        {name: _model_version(filename) for name, filename in MODEL_FILES.items()}
+    )
+    prediction_cache.clear()
+
+
+load_models()
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT = float(os.getenv("BATCH_MAX_WAIT", "0.005"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_MAX_RECORDS = int(os.getenv("BATCH_MAX_RECORDS", "1000"))
+
+SHADOW_WORKERS = int(os.getenv("SHADOW_WORKERS", "1"))
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "64"))
+
+metrics = MetricsRegistry()
+REQUESTS = metrics.counter(
+    "pricing_requests_total", "HTTP requests handled.", ("path", "status")
+)
+ERRORS = metrics.counter(
+    "pricing_errors_total", "HTTP requests that failed.", ("path", "kind")
+)
+IN_FLIGHT = metrics.gauge("pricing_requests_in_flight", "HTTP requests in progress.")
+REQUEST_SECONDS = metrics.histogram(
+    "pricing_request_seconds", "End-to-end HTTP request latency.", ("path",)
+)
+STAGE_SECONDS = metrics.histogram(
+    "pricing_stage_seconds", "Latency of prediction stages.", ("stage", "model")
+)
+BATCH_SIZE = metrics.histogram(
+    "pricing_batch_size",
+    "Records scored per model call.",
+    ("model",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+metrics.callback(
+    "pricing_cache_hits_total",
+    "Prediction cache hits.",
+    lambda: prediction_cache.hits,
+    type="counter",
+)
+metrics.callback(
+    "pricing_cache_misses_total",
+    "Prediction cache misses.",
+    lambda: prediction_cache.misses,
+    type="counter",
+)
+SHADOW_DROPPED = metrics.counter(
+    "pricing_shadow_dropped_total",
+    "Shadow scoring jobs dropped because too many were pending.",
+    ("model",),
+)
+if isinstance(csv_logger, BufferedCSVLogger):
+    metrics.callback(
+        "pricing_log_dropped_total",
+        "Log records dropped because the queue was full.",
+        lambda: csv_logger.dropped,
+        type="counter",
+    )
+
+
+def _choose_model_name() -> str:
     random_number = random.uniform(0, 1)
     if random_number < 0.5:
-        model = BASE_MODEL
-        model_name = "base"
+        return "base"
+    return "advanced"
+
+
+def _other_model_name(model_name: str) -> str:
+    return "advanced" if model_name == "base" else "base"
+
+
+def _score(
+    model_name: str, records: list[PredictionData], shadow: bool = False
+) -> list[float]:
+    model = MODELS[model_name]
+    label = f"{model_name}-shadow" if shadow else model_name
+    BATCH_SIZE.observe(len(records), model=label)
+
+    with STAGE_SECONDS.time(stage="model_dump", model=label):
+        data = [record.model_dump() for record in records]
+    if hasattr(model, "predict_records"):
+        with STAGE_SECONDS.time(stage="predict", model=label):
+            predictions = model.predict_records(data)
+    else:
+        with STAGE_SECONDS.time(stage="frame", model=label):
+            frame = pd.DataFrame(data)
+        with STAGE_SECONDS.time(stage="predict", model=label):
+            predictions = model.predict(frame)
+
+    with STAGE_SECONDS.time(stage="log", model=label):
+        _log_predictions(model_name, records, predictions, shadow)
+    return [float(prediction) for prediction in predictions]
+
+
+def _log_predictions(
+    model_name: str,
+    records: list[PredictionData],
+    predictions: list[float],
+    shadow: bool = False,
+) -> None:
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [
+        {
+            "level": "INFO",
+            "timestamp": timestamp,
+            "model": model_name,
+            "prediction": f"{prediction:.4f}",
+            "real": record.price,
+        }
+        for record, prediction in zip(records, predictions)
+    ]
+    if SHADOW_MODE:
+        for row in rows:
+            row["shadow"] = int(shadow)
+    csv_logger.log_many(rows)
+
+
+def _cache_key(data: PredictionData, model_name: str) -> str:
+    return prediction_cache.make_key(data, model_name, MODEL_VERSIONS[model_name])
+
+
+batcher = MicroBatcher(
+    _score,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait=BATCH_MAX_WAIT,
+    max_workers=BATCH_WORKERS,
+)
+shadow_batcher = MicroBatcher(
+    partial(_score, shadow=True),
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait=BATCH_MAX_WAIT,
+    max_workers=SHADOW_WORKERS,
+)
+shadow_slots = threading.BoundedSemaphore(SHADOW_MAX_PENDING)
+_shadow_tasks: set[asyncio.Task] = set()
+
+
+async def _start_shadow(model_name: str, records: list[PredictionData]) -> None:
+    if not shadow_slots.acquire(blocking=False):
+        SHADOW_DROPPED.inc(len(records), model=model_name)
+        return
+    task = asyncio.get_running_loop().create_task(_shadow_score(model_name, records))
+    _shadow_tasks.add(task)
+    task.add_done_callback(_finish_shadow)
+
+
+def _finish_shadow(task: asyncio.Task) -> None:
+    _shadow_tasks.discard(task)
+    shadow_slots.release()
+
+
+async def _shadow_score(model_name: str, records: list[PredictionData]) -> None:
+    keys = [_cache_key(record, model_name) for record in records]
+    cached = [prediction_cache.get(key) for key in keys]
+    hits = [i for i, prediction in enumerate(cached) if prediction is not None]
+    if hits:
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            partial(
+                _log_predictions,
+                model_name,
+                [records[i] for i in hits],
+                [cached[i] for i in hits],
+                shadow=True,
+            ),
+        )
+
+    misses = [i for i, prediction in enumerate(cached) if prediction is None]
+    if len(misses) == 1:
+        predictions = [await shadow_batcher.submit(model_name, records[misses[0]])]
+    elif misses:
+        predictions = await shadow_batcher.run(model_name, [records[i] for i in misses])
     else:
-        model = ADVANCED_MODEL
-        model_name = "advanced"
-
-    data_dict = data.model_dump()
-    prediction = model.predict(pd.DataFrame([data_dict]))
-    csv_logger.log(
-        level="INFO",
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        model=model_name,
-        prediction=f"{prediction[0]:.4f}",
-        real=data.price,
+        return
+
+    for i, prediction in zip(misses, predictions):
+        prediction_cache.put(keys[i], prediction)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    batcher.shutdown()
+    shadow_batcher.shutdown()
+    if isinstance(csv_logger, BufferedCSVLogger):
+        csv_logger.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    request.state.received_at = start = time.perf_counter()
+    IN_FLIGHT.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        IN_FLIGHT.dec()
+        path = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUESTS.inc(path=path, status=status)
+        if status >= 400:
+            ERRORS.inc(path=path, kind="client" if status < 500 else "server")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, path=path)
+
+
+def _observe_validation(request: Request, model_name: str) -> None:
+    elapsed = time.perf_counter() - request.state.received_at
+    STAGE_SECONDS.observe(elapsed, stage="validation", model=model_name)
+
+
+@app.post("/predict")
+async def predict_price(
+    data: PredictionData,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+):
+    model_name = _choose_model_name()
+    response.headers["X-Model-Arm"] = model_name
+    _observe_validation(request, model_name)
+    if SHADOW_MODE:
+        background_tasks.add_task(_start_shadow, _other_model_name(model_name), [data])
+
+    with STAGE_SECONDS.time(stage="cache", model=model_name):
+        key = _cache_key(data, model_name)
+        prediction = prediction_cache.get(key)
+    if prediction is not None:
+        # Sync background tasks run in the threadpool, so the file write stays off
+        # the event loop.
+        background_tasks.add_task(_log_predictions, model_name, [data], [prediction])
+        return {"prediction": prediction}
+
+    prediction = await batcher.submit(model_name, data)
+    prediction_cache.put(key, prediction)
+    return {"prediction": prediction}
+
+
+@app.post("/predict/batch")
+async def predict_price_batch(
+    data: list[PredictionData], request: Request, background_tasks: BackgroundTasks
+):
+    _observe_validation(request, "batch")
+    if len(data) > BATCH_MAX_RECORDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_MAX_RECORDS} records can be scored per request",
+        )
+
+    predictions = [0.0] * len(data)
+    arms = [""] * len(data)
+    keys = [""] * len(data)
+    groups: dict[str, list[int]] = {}
+    hits: dict[str, list[int]] = {}
+    shadow_groups: dict[str, list[PredictionData]] = {}
+    for i, record in enumerate(data):
+        model_name = arms[i] = _choose_model_name()
+        shadow_groups.setdefault(_other_model_name(model_name), []).append(record)
+        keys[i] = _cache_key(record, model_name)
+        prediction = prediction_cache.get(keys[i])
+        if prediction is None:
+            groups.setdefault(model_name, []).append(i)
+        else:
+            predictions[i] = prediction
+            hits.setdefault(model_name, []).append(i)
+
+    if SHADOW_MODE:
+        for model_name, records in shadow_groups.items():
+            background_tasks.add_task(_start_shadow, model_name, records)
+
+    for model_name, indices in hits.items():
+        background_tasks.add_task(
+            _log_predictions,
+            model_name,
+            [data[i] for i in indices],
+            [predictions[i] for i in indices],
+        )
+
+    results = await asyncio.gather(
+        *(
+            batcher.run(model_name, [data[i] for i in indices])
+            for model_name, indices in groups.items()
+        )
+    )
+    for indices, scores in zip(groups.values(), results):
+        for i, score in zip(indices, scores):
+            predictions[i] = score
+            prediction_cache.put(keys[i], score)
+
+    return {"predictions": predictions, "arms": arms}
+
+
+@app.post("/reload")
+async def reload_models():
+    await asyncio.get_running_loop().run_in_executor(batcher.executor, load_models)
+    return {"versions": MODEL_VERSIONS}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
     )
-    return {"prediction": float(prediction[0])}
 
 
 if __name__ == "__main__":
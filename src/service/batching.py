@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        predict_fn: Callable[[str, list[Any]], list[float]],
+        max_batch_size: int = 64,
+        max_wait: float = 0.005,
+        max_workers: int = 4,
+    ) -> None:
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self._pending: dict[str, list[tuple[Any, asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._in_flight: dict[str, int] = {}
+
+    async def submit(self, key: str, item: Any) -> float:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future))
+
+        if len(pending) >= self.max_batch_size or not self._in_flight.get(key):
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        return await future
+
+    async def run(self, key: str, items: list[Any]) -> list[float]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.predict_fn, key, items)
+
+    def shutdown(self) -> None:
+        for key in list(self._pending):
+            self._flush(key)
+        self.executor.shutdown(wait=True)
+
+    def _flush(self, key: str) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(key, [])
+        if not batch:
+            return
+
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(
+            self.executor, self.predict_fn, key, [item for item, _ in batch]
+        )
+        task.add_done_callback(partial(self._resolve, key, batch))
+
+    def _resolve(
+        self, key: str, batch: list[tuple[Any, asyncio.Future]], task: asyncio.Future
+    ) -> None:
+        self._in_flight[key] -= 1
+
+        error = task.exception() if not task.cancelled() else asyncio.CancelledError()
+        results = task.result() if error is None else None
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+        if self._pending.get(key):
+            self._flush(key)
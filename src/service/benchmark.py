@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+from pydantic import ValidationError
+
+from src.service.model import PredictionData
+
+ARM_HEADER = "X-Model-Arm"
+
+
+def load_payloads(path: str | Path) -> list[dict]:
+    with open(path) as file_handle:
+        return [json.loads(line) for line in file_handle if line.strip()]
+
+
+def synthetic_payloads(listings_path: str | Path, n: int, seed: int = 42) -> list[dict]:
+    import src.transformations.listings as listings_transforms
+    from src.transformations.target import transform_pipeline as target_pipeline
+
+    listings = pd.read_csv(listings_path)
+    features = listings_transforms.transform_pipeline(listings).drop(columns=["id"])
+    features["price"] = target_pipeline(listings["price"])
+
+    rng = np.random.default_rng(seed)
+    features["listing_views_ltm"] = rng.poisson(100, len(features))
+    features["conversion_rate_ltm"] = rng.uniform(0.0, 0.2, len(features))
+    features["average_lead_time"] = rng.exponential(14.0, len(features))
+    features["average_booking_duration"] = rng.exponential(4.0, len(features))
+
+    features = features.fillna(features.mode().iloc[0])
+
+    payloads = []
+    for record in features.to_dict(orient="records"):
+        try:
+            payloads.append(PredictionData.model_validate(record).model_dump())
+        except ValidationError:
+            continue
+    if not payloads:
+        raise ValueError(f"No valid payloads could be built from {listings_path}")
+
+    indices = rng.integers(0, len(payloads), n)
+    return [payloads[i] for i in indices]
+
+
+async def _replay(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    payloads: list[dict] | list[list[dict]],
+    concurrency: int,
+    rate: float,
+) -> tuple[list[tuple[str, float, int]], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    results: list[tuple[str, float, int]] = []
+
+    async def send(i: int, payload: dict | list[dict], start: float) -> None:
+        if rate > 0:
+            await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        async with semaphore:
+            batch = isinstance(payload, list)
+            sent_at = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=payload)
+                status = response.status_code
+                arm = response.headers.get(ARM_HEADER, "unknown")
+                # The batch endpoint reports the arm chosen for every record.
+                arms = response.json()["arms"] if batch and status == 200 else None
+            except httpx.HTTPError:
+                status, arm, arms = 0, "unknown", None
+            latency = time.perf_counter() - sent_at
+            if arms is None:
+                arms = [arm] * (len(payload) if batch else 1)
+            results.extend((record_arm, latency, status) for record_arm in arms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(i, p, start) for i, p in enumerate(payloads)))
+    return results, time.perf_counter() - start
+
+
+def _summarize(
+    results: list[tuple[str, float, int]], elapsed: float, requests: int
+) -> dict:
+    # Rows are records: a batch call adds one row per record with the call's
+    # latency, so throughput is in records/s for both endpoints.
+    def stats(rows: list[tuple[str, float, int]]) -> dict:
+        latencies = np.array([latency for _, latency, status in rows if status == 200])
+        summary = {
+            "records": len(rows),
+            "errors": sum(1 for _, _, status in rows if status != 200),
+            "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        }
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+            summary.update(
+                p50_ms=p50, p95_ms=p95, p99_ms=p99, mean_ms=latencies.mean() * 1000
+            )
+        return summary
+
+    arms = sorted({arm for arm, _, _ in results})
+    return {
+        "elapsed_s": elapsed,
+        "requests": requests,
+        "total": stats(results),
+        "arms": {arm: stats([row for row in results if row[0] == arm]) for arm in arms},
+    }
+
+
+async def _run_asgi(args, payloads: list[dict] | list[list[dict]]):
+    from src.service.app import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        return await _replay(
+            client, args.endpoint, payloads, args.concurrency, args.rate
+        )
+
+
+async def _run_uvicorn(args, payloads: list[dict] | list[list[dict]]):
+    base_url = f"http://127.0.0.1:{args.port}"
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "src.service.app:app",
+        "--port",
+        str(args.port),
+        "--workers",
+        str(args.workers),
+        "--log-level",
+        "warning",
+    ]
+    server = subprocess.Popen(command)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(
+            base_url=base_url, limits=limits, timeout=60.0
+        ) as client:
+            deadline = time.monotonic() + args.startup_timeout
+            while True:
+                try:
+                    await client.get("/metrics")
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("uvicorn did not start")
+                    await asyncio.sleep(0.2)
+            return await _replay(
+                client, args.endpoint, payloads, args.concurrency, args.rate
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(description="Benchmark the pricing service.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--requests", help="JSONL file with one payload per line")
+    source.add_argument("--listings", help="listings CSV to build synthetic payloads")
+    parser.add_argument("-n", "--num-requests", type=int, default=1000)
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--endpoint", default="/predict")
+    parser.add_argument(
+        "--batch-size", type=int, default=16, help="records per /predict/batch call"
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=0.0, help="requests/s, 0=max")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="where to save the JSON report")
+    args = parser.parse_args(argv)
+
+    if args.requests:
+        payloads = load_payloads(args.requests)
+        payloads = (payloads * (args.num_requests // len(payloads) + 1))[
+            : args.num_requests
+        ]
+    else:
+        payloads = synthetic_payloads(args.listings, args.num_requests, args.seed)
+    if args.endpoint == "/predict/batch":
+        payloads = [
+            payloads[i : i + args.batch_size]
+            for i in range(0, len(payloads), args.batch_size)
+        ]
+
+    runner = _run_asgi if args.mode == "asgi" else _run_uvicorn
+    results, elapsed = asyncio.run(runner(args, payloads))
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": _summarize(results, elapsed, len(payloads)),
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w") as file_handle:
+            json.dump(report, file_handle, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
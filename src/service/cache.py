@@ -0,0 +1,54 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from src.service.model import PredictionData
+
+
+class PredictionCache:
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(data: PredictionData, model_name: str, model_version: str) -> str:
+        features = data.model_dump(exclude={"price"})
+        canonical = json.dumps(features, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(
+            f"{model_name}\0{model_version}\0{canonical}".encode()
+        ).hexdigest()
+
+    def get(self, key: str) -> float | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, prediction: float) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, prediction)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+
+from src.preprocessor import Preprocessor
+
+_UNKNOWN = "__unknown__"
+# Preprocessors that encode in float32 round every feature, so their self-check
+# needs float32-sized tolerances.
+_TOLERANCES = {np.dtype(np.float64): (1e-7, 1e-6), np.dtype(np.float32): (1e-4, 1e-3)}
+
+
+class LinearPlan:
+    def __init__(
+        self,
+        numeric_columns: list[str],
+        fill_values: np.ndarray,
+        coefficients: np.ndarray,
+        categorical_columns: list[str],
+        categorical_fill_values: list,
+        lookup_tables: list[dict],
+        unknown_values: np.ndarray,
+        intercept: float,
+    ) -> None:
+        self.numeric_columns = numeric_columns
+        self.fill_values = fill_values
+        self.coefficients = coefficients
+        self.categorical_columns = categorical_columns
+        self.categorical_fill_values = categorical_fill_values
+        self.lookup_tables = lookup_tables
+        self.unknown_values = unknown_values
+        self.intercept = intercept
+
+    def predict_arrays(
+        self, numeric: np.ndarray, categorical: np.ndarray
+    ) -> np.ndarray:
+        numeric = np.asarray(numeric, dtype=np.float64)
+        numeric = np.where(np.isnan(numeric), self.fill_values, numeric)
+        prediction = numeric @ self.coefficients + self.intercept
+
+        for j, (table, fill, unknown) in enumerate(
+            zip(self.lookup_tables, self.categorical_fill_values, self.unknown_values)
+        ):
+            prediction += [
+                table.get(fill if _is_missing(value) else value, unknown)
+                for value in categorical[:, j]
+            ]
+        return prediction
+
+    def predict_records(self, records: list[dict]) -> np.ndarray:
+        numeric = np.array(
+            [
+                [record.get(col, np.nan) for col in self.numeric_columns]
+                for record in records
+            ],
+            dtype=np.float64,
+        ).reshape(len(records), len(self.numeric_columns))
+        categorical = np.array(
+            [
+                [record.get(col) for col in self.categorical_columns]
+                for record in records
+            ],
+            dtype=object,
+        ).reshape(len(records), len(self.categorical_columns))
+        return self.predict_arrays(numeric, categorical)
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        numeric = X[self.numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        categorical = X[self.categorical_columns].to_numpy(dtype=object)
+        return self.predict_arrays(numeric, categorical)
+
+
+def _is_missing(value) -> bool:
+    return value is None or value != value
+
+
+def _imputer_fill_values(imputer: SimpleImputer) -> tuple[list, np.ndarray]:
+    fill_values = list(imputer.statistics_)
+    if imputer.strategy == "constant" or imputer.keep_empty_features:
+        kept = np.ones(len(fill_values), dtype=bool)
+    else:
+        kept = np.array([not _is_missing(value) for value in fill_values], dtype=bool)
+    return fill_values, kept
+
+
+def compile_linear_pipeline(
+    pipeline, rtol: float | None = None, atol: float | None = None
+):
+    preprocessor, regressor = pipeline.steps[0][1], pipeline.steps[-1][1]
+    if len(pipeline.steps) != 2 or not isinstance(preprocessor, Preprocessor):
+        raise ValueError("Expected a Preprocessor followed by a regressor")
+    if not isinstance(regressor, LinearRegression) or np.ndim(regressor.coef_) != 1:
+        raise ValueError("Only single-output LinearRegression can be compiled")
+
+    default_rtol, default_atol = _TOLERANCES.get(
+        np.dtype(preprocessor.dtype or np.float64), _TOLERANCES[np.dtype(np.float32)]
+    )
+    rtol = default_rtol if rtol is None else rtol
+    atol = default_atol if atol is None else atol
+
+    coefficients = np.asarray(regressor.coef_, dtype=np.float64)
+    transformer = preprocessor.transformer
+
+    numeric_columns, fill_values, numeric_coefficients = [], [], []
+    categorical_columns, categorical_fill_values = [], []
+    lookup_tables, unknown_values = [], []
+
+    for name, block, columns in transformer.transformers_:
+        if name == "remainder" or block == "drop" or len(columns) == 0:
+            continue
+        steps = dict(block.steps)
+        block_coefficients = coefficients[transformer.output_indices_[name]]
+        block_fill_values, kept = _imputer_fill_values(steps["imputer"])
+        columns = [col for col, keep in zip(columns, kept) if keep]
+        block_fill_values = [
+            value for value, keep in zip(block_fill_values, kept) if keep
+        ]
+
+        if "ohe" in steps:
+            encoder: OneHotEncoder = steps["ohe"]
+            if encoder.drop is not None or encoder.handle_unknown != "ignore":
+                raise ValueError("Unsupported OneHotEncoder configuration")
+            offset = 0
+            for col, fill, categories in zip(
+                columns, block_fill_values, encoder.categories_
+            ):
+                weights = block_coefficients[offset : offset + len(categories)]
+                offset += len(categories)
+                categorical_columns.append(col)
+                categorical_fill_values.append(fill)
+                lookup_tables.append(dict(zip(categories.tolist(), weights.tolist())))
+                unknown_values.append(0.0)
+        elif "ord" in steps:
+            encoder: OrdinalEncoder = steps["ord"]
+            for col, fill, categories, weight in zip(
+                columns, block_fill_values, encoder.categories_, block_coefficients
+            ):
+                categorical_columns.append(col)
+                categorical_fill_values.append(fill)
+                lookup_tables.append(
+                    {
+                        category: code * weight
+                        for code, category in enumerate(categories)
+                    }
+                )
+                unknown_values.append(encoder.unknown_value * weight)
+        elif set(steps) == {"imputer"}:
+            numeric_columns.extend(columns)
+            fill_values.extend(block_fill_values)
+            numeric_coefficients.extend(block_coefficients.tolist())
+        else:
+            raise ValueError(f"Unsupported preprocessing block: {name}")
+
+    plan = LinearPlan(
+        numeric_columns=numeric_columns,
+        fill_values=np.asarray(fill_values, dtype=np.float64),
+        coefficients=np.asarray(numeric_coefficients, dtype=np.float64),
+        categorical_columns=categorical_columns,
+        categorical_fill_values=categorical_fill_values,
+        lookup_tables=lookup_tables,
+        unknown_values=np.asarray(unknown_values, dtype=np.float64),
+        intercept=float(regressor.intercept_),
+    )
+
+    probe = _probe_frame(plan, transformer.feature_names_in_)
+    expected = pipeline.predict(probe)
+    if not np.allclose(plan.predict(probe), expected, rtol=rtol, atol=atol):
+        raise ValueError("Compiled plan does not match pipeline.predict")
+    return plan
+
+
+def _probe_frame(plan: LinearPlan, columns) -> pd.DataFrame:
+    n_rows = max([len(table) for table in plan.lookup_tables] + [1]) + 2
+    probe = {col: np.full(n_rows, np.nan) for col in columns}
+
+    steps = np.arange(n_rows, dtype=np.float64)
+    for col, fill in zip(plan.numeric_columns, plan.fill_values):
+        probe[col] = fill * (1 + 0.1 * steps) + steps
+        probe[col][0] = np.nan
+    for col, table in zip(plan.categorical_columns, plan.lookup_tables):
+        categories = list(table)
+        values = [None] + [categories[i % len(categories)] for i in range(n_rows - 2)]
+        probe[col] = np.array(values + [_UNKNOWN], dtype=object)
+
+    return pd.DataFrame(probe)
@@ -1,10 +1,18 @@
+import atexit
 import csv
+import fcntl
+import os
+import queue
+import threading
+import time
+from typing import Literal
 
 
 class CSVLogger:
     def __init__(self, filename: str, fields: list[str]) -> None:
         self.filename = filename
         self.fields = fields
+        self._lock = threading.Lock()
 
         self._initalize_header()
 
@@ -14,9 +22,175 @@ class CSVLogger:
                 writer = csv.writer(file_handle)
                 writer.writerow(self.fields)
         except FileExistsError:
-            pass
+            with open(self.filename) as file_handle:
+                header = next(csv.reader(file_handle), None)
+            # A file that already has every field keeps its header, so turning an
+            # optional column off does not move the log aside.
+            if header is not None and set(self.fields) <= set(header):
+                self.fields = header
+            elif header != self.fields:
+                os.replace(
+                    self.filename, f"{self.filename}.{time.strftime('%Y%m%d%H%M%S')}"
+                )
+                self._initalize_header()
 
     def log(self, **kwargs) -> None:
-        with open(self.filename, mode="a") as file_handle:
+        self.log_many([kwargs])
+
+    def log_many(self, records: list[dict]) -> None:
+        with self._lock, open(self.filename, mode="a") as file_handle:
             writer = csv.DictWriter(file_handle, fieldnames=self.fields)
-            writer.writerow(kwargs)
+            writer.writerows(records)
+
+
+class BufferedCSVLogger(CSVLogger):
+    def __init__(
+        self,
+        filename: str,
+        fields: list[str],
+        max_queue_size: int = 10000,
+        on_full: Literal["block", "drop_newest", "drop_oldest"] = "block",
+        batch_size: int = 512,
+        flush_interval: float = 0.5,
+        fsync_interval: float = 5.0,
+        max_bytes: int | None = None,
+        rotate_interval: float | None = None,
+        backup_count: int = 5,
+        close_timeout: float = 10.0,
+    ) -> None:
+        super().__init__(filename, fields)
+        if on_full not in ("block", "drop_newest", "drop_oldest"):
+            raise ValueError(f"Unknown on_full policy: {on_full}")
+
+        self.on_full = on_full
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.close_timeout = close_timeout
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log_many(self, records: list[dict]) -> None:
+        for record in records:
+            self._put(record)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._stopping.set()
+        self._thread.join(timeout=self.close_timeout)
+
+    def _drop(self) -> None:
+        with self._lock:
+            self.dropped += 1
+
+    def _put(self, record: dict) -> None:
+        if self._closed:
+            raise RuntimeError("Logger is closed")
+        if self.on_full == "block":
+            while True:
+                try:
+                    self._queue.put(record, timeout=self.flush_interval)
+                    return
+                except queue.Full:
+                    if not self._thread.is_alive():
+                        self._drop()
+                        return
+
+        while True:
+            try:
+                self._queue.put_nowait(record)
+                return
+            except queue.Full:
+                self._drop()
+                if self.on_full == "drop_newest":
+                    return
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run(self) -> None:
+        file_handle = open(self.filename, mode="a")
+        writer = csv.DictWriter(file_handle, fieldnames=self.fields)
+        opened_at = last_fsync = time.monotonic()
+
+        try:
+            while True:
+                batch = []
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+                    while len(batch) < self.batch_size:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+                stop = self._stopping.is_set() and self._queue.empty()
+
+                if self._rotated_elsewhere(file_handle):
+                    file_handle.close()
+                    file_handle = open(self.filename, mode="a")
+                    writer = csv.DictWriter(file_handle, fieldnames=self.fields)
+                    opened_at = time.monotonic()
+
+                if batch:
+                    writer.writerows(batch)
+                    file_handle.flush()
+
+                now = time.monotonic()
+                if stop or now - last_fsync >= self.fsync_interval:
+                    os.fsync(file_handle.fileno())
+                    last_fsync = now
+                if stop:
+                    break
+
+                if self._should_rotate(file_handle, now - opened_at):
+                    self._rotate(file_handle)
+                    file_handle.close()
+                    file_handle = open(self.filename, mode="a")
+                    writer = csv.DictWriter(file_handle, fieldnames=self.fields)
+                    opened_at = last_fsync = time.monotonic()
+        finally:
+            file_handle.close()
+
+    def _rotated_elsewhere(self, file_handle) -> bool:
+        if self.max_bytes is None and self.rotate_interval is None:
+            return False
+        try:
+            return (
+                os.stat(self.filename).st_ino != os.fstat(file_handle.fileno()).st_ino
+            )
+        except FileNotFoundError:
+            return True
+
+    def _should_rotate(self, file_handle, age: float) -> bool:
+        if self.max_bytes is not None and file_handle.tell() >= self.max_bytes:
+            return True
+        return self.rotate_interval is not None and age >= self.rotate_interval
+
+    def _rotate(self, file_handle) -> None:
+        # Workers sharing the file rotate under a lock; a worker whose file was
+        # already rotated by another process only reopens it.
+        with open(f"{self.filename}.lock", mode="w") as lock_handle:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX)
+            if self._rotated_elsewhere(file_handle):
+                return
+
+            for i in range(self.backup_count - 1, 0, -1):
+                source = f"{self.filename}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.filename}.{i + 1}")
+            if self.backup_count > 0:
+                os.replace(self.filename, f"{self.filename}.1")
+            else:
+                os.remove(self.filename)
+            self._initalize_header()
@@ -0,0 +1,208 @@
+import argparse
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+
+from src.preprocessor import Preprocessor
+from src.selector import FeatureSelector
+
+
+class PackedForest:
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+    ) -> None:
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_forest(cls, forest, feature_map: np.ndarray | None = None):
+        if forest.n_outputs_ != 1:
+            raise ValueError("Only single-output forests can be packed")
+
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+        left = np.concatenate(
+            [tree.children_left + root for tree, root in zip(trees, roots)]
+        )
+        right = np.concatenate(
+            [tree.children_right + root for tree, root in zip(trees, roots)]
+        )
+        feature = np.concatenate([tree.feature for tree in trees])
+        threshold = np.concatenate([tree.threshold for tree in trees])
+        value = np.concatenate([tree.value[:, 0, 0] for tree in trees])
+
+        leaf = np.concatenate([tree.children_left == -1 for tree in trees])
+        nodes = np.arange(len(leaf))
+        left[leaf] = nodes[leaf]
+        right[leaf] = nodes[leaf]
+        feature[leaf] = 0
+        threshold[leaf] = np.inf
+        if feature_map is not None:
+            feature = np.asarray(feature_map)[feature]
+
+        # X is compared in float32, so round thresholds down to keep every split
+        # decision identical to sklearn's float64 threshold.
+        threshold32 = threshold.astype(np.float32)
+        rounded_up = threshold32 > threshold
+        threshold32[rounded_up] = np.nextafter(
+            threshold32[rounded_up], np.float32(-np.inf)
+        )
+
+        return cls(
+            feature=feature.astype(np.int32),
+            threshold=threshold32,
+            children=np.stack([left, right], axis=1).ravel().astype(np.int32),
+            value=value.astype(np.float64),
+            roots=roots.astype(np.int32),
+            max_depth=max(int(tree.max_depth) for tree in trees),
+        )
+
+    def predict(self, X: np.ndarray, chunk_size: int = 4096) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        prediction = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_size):
+            chunk = X[start : start + chunk_size]
+            prediction[start : start + len(chunk)] = self._predict_chunk(chunk)
+        return prediction
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        values = X.ravel()
+        # Pairs are ordered tree by tree, so neighbouring pairs read the same tree.
+        offsets = np.tile(np.arange(n_rows, dtype=np.intp) * n_features, n_trees)
+        node = np.repeat(self.roots.astype(np.intp), n_rows)
+        leaves = np.empty(len(node), dtype=np.intp)
+        pairs = np.arange(len(node), dtype=np.intp)
+
+        # Leaves point to themselves, so pairs can take a few steps between checks.
+        # Finished pairs are dropped once they make up half of the active set,
+        # so deep trees do not cost max_depth steps for every row.
+        while len(node):
+            for _ in range(2):
+                index = np.take(self.feature, node).astype(np.intp)
+                index += offsets
+                right = np.take(values, index) > np.take(self.threshold, node)
+                node *= 2
+                node += right
+                node = np.take(self.children, node).astype(np.intp)
+            done = np.take(self.children, 2 * node) == node
+            n_done = np.count_nonzero(done)
+            if n_done * 2 >= len(node):
+                leaves[pairs[done]] = node[done]
+                active = ~done
+                pairs, offsets, node = pairs[active], offsets[active], node[active]
+
+        return self.value[leaves].reshape(n_trees, n_rows).mean(axis=0)
+
+
+class PackedForestPipeline:
+    def __init__(self, preprocessor: Preprocessor, forest: PackedForest) -> None:
+        self.preprocessor = preprocessor
+        self.forest = forest
+
+    def predict(self, X) -> np.ndarray:
+        features = self.preprocessor.transformer.transform(X)
+        if sparse.issparse(features):
+            features = features.toarray()
+        return self.forest.predict(features)
+
+    def save(self, path: str | Path) -> None:
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path: str | Path, mmap_mode: str | None = "r") -> "PackedForestPipeline":
+        return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def pack_forest_pipeline(pipeline) -> PackedForestPipeline:
+    steps = [step for _, step in pipeline.steps]
+    preprocessor, regressor = steps[0], steps[-1]
+    if not isinstance(preprocessor, Preprocessor):
+        raise ValueError("Expected a Preprocessor as the first step")
+    if not isinstance(regressor, (RandomForestRegressor, ExtraTreesRegressor)):
+        raise ValueError("Expected a forest regressor as the last step")
+
+    feature_map = None
+    if len(steps) == 3 and isinstance(steps[1], FeatureSelector):
+        feature_names = preprocessor.transformer.get_feature_names_out().tolist()
+        feature_map = np.array(
+            [feature_names.index(col) for col in steps[1].selected_features_]
+        )
+    elif len(steps) != 2:
+        raise ValueError("Unsupported pipeline layout")
+
+    return PackedForestPipeline(
+        preprocessor, PackedForest.from_forest(regressor, feature_map)
+    )
+
+
+def benchmark(
+    n_trees: int = 100,
+    n_features: int = 40,
+    batch_sizes: tuple[int, ...] = (1, 100, 1000),
+    repeat: int = 5,
+) -> None:
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(5000, n_features))
+    y = X[:, :5].sum(axis=1) + rng.normal(size=len(X))
+    forest = RandomForestRegressor(n_trees, random_state=0).fit(X, y)
+    packed = PackedForest.from_forest(forest)
+
+    for batch_size in batch_sizes:
+        batch = rng.normal(size=(batch_size, n_features))
+        if not np.allclose(packed.predict(batch), forest.predict(batch)):
+            raise AssertionError("Packed predictions differ from sklearn")
+        timings = []
+        for predict in (forest.predict, packed.predict):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                predict(batch)
+            timings.append((time.perf_counter() - start) / repeat * 1e3)
+        print(
+            f"rows={batch_size:<6} sklearn={timings[0]:.1f}ms packed={timings[1]:.1f}ms"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Pack or benchmark forest models.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pack = commands.add_parser("pack", help="pack a fitted forest pipeline")
+    pack.add_argument("source", help="joblib file with the sklearn pipeline")
+    pack.add_argument("destination", help="where to save the packed pipeline")
+
+    bench = commands.add_parser("benchmark", help="compare against sklearn")
+    bench.add_argument("--trees", type=int, default=100)
+    bench.add_argument("--features", type=int, default=40)
+    bench.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000])
+    bench.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        pack_forest_pipeline(joblib.load(args.source)).save(args.destination)
+    else:
+        benchmark(args.trees, args.features, tuple(args.batch_sizes), args.repeat)
+
+
+if __name__ == "__main__":
+    # Re-import so pickled classes resolve to src.service.packed, not __main__.
+    from src.service.packed import main
+
+    main()
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.pipeline import Pipeline
+
+from src.service.packed import PackedForest
+
+_FORESTS = (RandomForestRegressor, ExtraTreesRegressor)
+
+
+class MappedForest(RegressorMixin, BaseEstimator):
+    @classmethod
+    def from_forest(cls, forest) -> "MappedForest":
+        mapped = cls()
+        mapped.packed_ = PackedForest.from_forest(forest)
+        mapped.n_features_in_ = forest.n_features_in_
+        mapped.feature_importances_ = forest.feature_importances_
+        return mapped
+
+    def fit(self, X, y):
+        raise TypeError(
+            "MappedForest cannot be fitted; use MappedForest.from_forest on a "
+            "fitted forest instead"
+        )
+
+    def predict(self, X) -> np.ndarray:
+        return self.packed_.predict(X)
+
+
+def _map_forests(model):
+    if isinstance(model, _FORESTS):
+        return MappedForest.from_forest(model)
+    if isinstance(model, Pipeline):
+        model.steps = [(name, _map_forests(step)) for name, step in model.steps]
+    elif isinstance(getattr(model, "estimator_", None), _FORESTS):
+        model.estimator_ = MappedForest.from_forest(model.estimator_)
+    return model
+
+
+def export_shared(model, path: str | Path) -> None:
+    joblib.dump(_map_forests(model), path)
+
+
+def load_shared(path: str | Path):
+    return joblib.load(path, mmap_mode="r")
+
+
+def export_directory(source_dir: Path, store_dir: Path) -> None:
+    store_dir.mkdir(parents=True, exist_ok=True)
+    for source in sorted(source_dir.glob("*.joblib")):
+        export_shared(joblib.load(source), store_dir / source.name)
+        print(f"Exported {source} -> {store_dir / source.name}")
+
+
+if __name__ == "__main__":
+    # Re-import so pickled classes resolve to src.service.store, not __main__.
+    from src.service.store import export_directory
+
+    export_directory(Path(sys.argv[1]), Path(sys.argv[2]))
@@ -0,0 +1,148 @@
+import itertools
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ["action", "property_type", "room_type"]
+DATE_COLUMNS = ["timestamp", "booking_date"]
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_path(source: str | Path) -> Path:
+    return Path(source).with_suffix(".snapshot")
+
+
+def _save_dictionary(directory: Path, name: str, values) -> None:
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(directory / f"{name}.offsets.npy", offsets)
+    np.save(directory / f"{name}.bytes.npy", np.frombuffer(b"".join(encoded), np.uint8))
+
+
+def _load_dictionary(directory: Path, name: str) -> np.ndarray:
+    offsets = np.load(directory / f"{name}.offsets.npy")
+    data = np.load(directory / f"{name}.bytes.npy", mmap_mode="r").tobytes()
+    values = np.empty(len(offsets) - 1, dtype=object)
+    for i, (start, end) in enumerate(itertools.pairwise(offsets)):
+        values[i] = data[start:end].decode()
+    return values
+
+
+def _code_dtype(size: int) -> np.dtype:
+    return np.min_scalar_type(-size - 1)
+
+
+def snapshot_csv(
+    source: str | Path,
+    destination: str | Path | None = None,
+    categorical: list[str] = CATEGORICAL_COLUMNS,
+    dates: list[str] = DATE_COLUMNS,
+) -> Path:
+    source = Path(source)
+    destination = snapshot_path(source) if destination is None else Path(destination)
+    destination.mkdir(parents=True, exist_ok=True)
+
+    df = pd.read_csv(source)
+    columns = {}
+    for i, (name, series) in enumerate(df.items()):
+        key = f"c{i}"
+        if name in dates:
+            series = pd.to_datetime(series, errors="coerce").astype("datetime64[ns]")
+            np.save(destination / f"{key}.npy", series.to_numpy())
+            columns[name] = {"key": key, "kind": "numeric"}
+            continue
+
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            np.save(destination / f"{key}.npy", series.to_numpy())
+            columns[name] = {"key": key, "kind": "numeric"}
+            continue
+
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        np.save(
+            destination / f"{key}.codes.npy", codes.astype(_code_dtype(len(uniques)))
+        )
+        _save_dictionary(destination, key, uniques)
+        kind = "categorical" if name in categorical else "text"
+        columns[name] = {"key": key, "kind": kind}
+
+    stat = source.stat()
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "source_size": stat.st_size,
+        "rows": len(df),
+        "columns": columns,
+    }
+    tmp_path = destination / "meta.json.tmp"
+    tmp_path.write_text(json.dumps(meta))
+    os.replace(tmp_path, destination / "meta.json")
+    return destination
+
+
+def _is_fresh(source: Path, meta: dict) -> bool:
+    if not source.exists():
+        return True
+    stat = source.stat()
+    return (
+        meta["version"] == SNAPSHOT_VERSION
+        and meta["source_mtime_ns"] >= stat.st_mtime_ns
+        and meta["source_size"] == stat.st_size
+    )
+
+
+def _read_meta(directory: Path) -> dict | None:
+    meta_path = directory / "meta.json"
+    if not meta_path.exists():
+        return None
+    return json.loads(meta_path.read_text())
+
+
+def load_snapshot(
+    source: str | Path,
+    columns: list[str] | None = None,
+    refresh: bool = True,
+) -> pd.DataFrame:
+    source = Path(source)
+    directory = snapshot_path(source)
+    meta = _read_meta(directory)
+
+    if meta is None or not _is_fresh(source, meta):
+        if not refresh:
+            raise ValueError(f"Snapshot of {source} is missing or out of date")
+        meta = _read_meta(snapshot_csv(source, directory))
+
+    if columns is None:
+        columns = list(meta["columns"])
+
+    # Copy-on-write maps keep columns writable; pages are only copied when written.
+    data = {}
+    for name in columns:
+        column = meta["columns"][name]
+        key = column["key"]
+        if column["kind"] == "numeric":
+            data[name] = np.load(directory / f"{key}.npy", mmap_mode="c")
+            continue
+
+        codes = np.load(directory / f"{key}.codes.npy", mmap_mode="c")
+        uniques = _load_dictionary(directory, key)
+        if column["kind"] == "categorical":
+            data[name] = pd.Categorical.from_codes(codes, uniques)
+        else:
+            values = np.append(uniques, None)[codes]
+            data[name] = pd.array(values, dtype="str")
+
+    return pd.DataFrame(
+        data, index=pd.RangeIndex(meta["rows"]), columns=columns, copy=False
+    )
+
+
+if __name__ == "__main__":
+    from src.snapshot import snapshot_csv
+
+    for source in sys.argv[1:]:
+        print(snapshot_csv(source))
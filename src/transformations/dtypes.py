@@ -0,0 +1,38 @@
+import pandas as pd
+
+FLAG_COLUMNS = [
+    "host_is_superhost",
+    "host_identity_verified",
+    "instant_bookable",
+    "is_luxury",
+    "is_bathroom_shared",
+]
+
+# Every listed column gets the same dtype on every call, whatever the values in
+# the frame, so compacted chunks always share one schema. Nullable types keep
+# missing values.
+COMPACT_DTYPES = {col: "UInt8" for col in FLAG_COLUMNS} | {
+    "accommodates": "UInt16",
+    "amenity_count": "UInt16",
+    "number_of_reviews": "UInt32",
+    "minimum_nights": "UInt32",
+    "maximum_nights": "UInt32",
+}
+
+
+def _compact_dtype(name: str, series: pd.Series) -> str | None:
+    if name in COMPACT_DTYPES:
+        return COMPACT_DTYPES[name]
+    if name.startswith("amenity_") or pd.api.types.is_bool_dtype(series):
+        return "UInt8"
+    if pd.api.types.is_numeric_dtype(series):
+        return "float32"
+    return None
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    columns = {}
+    for name, series in df.items():
+        dtype = _compact_dtype(name, series)
+        columns[name] = series if dtype is None else series.astype(dtype)
+    return pd.DataFrame(columns, index=df.index)
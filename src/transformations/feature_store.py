@@ -0,0 +1,124 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from src.transformations import features, listings, sentiment
+from src.transformations.features import INITIAL_FEATURES
+from src.transformations.sentiment import SENTIMENT_VERSION, SentimentEngine
+
+
+def _source_hash(*modules) -> str:
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+# Any edit to the transformation code invalidates stored features.
+TRANSFORM_VERSION = f"{_source_hash(listings, features, sentiment)}:{SENTIMENT_VERSION}"
+
+
+def fingerprint_rows(df: pd.DataFrame) -> pd.Series:
+    return pd.util.hash_pandas_object(df.loc[:, INITIAL_FEATURES], index=False)
+
+
+class FeatureStore:
+    def __init__(
+        self,
+        path: str | Path | None = ".cache/listings_features.pkl",
+        version: str = TRANSFORM_VERSION,
+    ) -> None:
+        self.path = path
+        self.version = version
+        self.features = None
+        self.fingerprints = pd.Series(dtype="uint64")
+        self.computed = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def transform(
+        self, df: pd.DataFrame, sentiment_engine: SentimentEngine | None = None
+    ) -> pd.DataFrame:
+        if df["id"].duplicated().any():
+            raise ValueError("Listing ids must be unique")
+
+        fingerprints = fingerprint_rows(df).set_axis(df["id"].to_numpy())
+        cached = self.fingerprints.reindex(fingerprints.index, fill_value=0)
+        changed = (cached != fingerprints).to_numpy()
+
+        if changed.any():
+            computed = listings.transform_pipeline(df.loc[changed], sentiment_engine)
+            computed = computed.set_axis(fingerprints.index[changed])
+            self._update(computed, fingerprints[changed])
+            self.computed = int(changed.sum())
+            self._save()
+        else:
+            self.computed = 0
+
+        features = self.features.loc[fingerprints.index]
+        return features.set_axis(df.index)
+
+    def retain(self, ids) -> int:
+        """Drop every stored listing whose id is not in ids; return how many."""
+        stale = ~self.fingerprints.index.isin(pd.Index(ids))
+        if stale.any():
+            self.fingerprints = self.fingerprints[~stale]
+            self.features = self.features.loc[self.fingerprints.index]
+            self._save()
+        return int(stale.sum())
+
+    def clear(self) -> None:
+        self.features = None
+        self.fingerprints = pd.Series(dtype="uint64")
+        if self.path is not None:
+            Path(self.path).unlink(missing_ok=True)
+
+    def _update(self, computed: pd.DataFrame, fingerprints: pd.Series) -> None:
+        if self.features is None:
+            self.features = computed
+            self.fingerprints = fingerprints
+            return
+
+        keep = ~self.fingerprints.index.isin(fingerprints.index)
+        self.features = pd.concat([self.features.loc[keep], computed])
+        self.fingerprints = pd.concat([self.fingerprints[keep], fingerprints])
+
+    def _load(self) -> None:
+        if self.path is None or not Path(self.path).exists():
+            return
+
+        stored = pd.read_pickle(self.path)
+        if stored["version"] != self.version:
+            return
+        self.features = stored["features"]
+        self.fingerprints = stored["fingerprints"]
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+
+        path = Path(self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Cloned stores share a path, so each save writes its own temporary file.
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+        ) as file_handle:
+            tmp_path = file_handle.name
+        try:
+            pd.to_pickle(
+                {
+                    "version": self.version,
+                    "features": self.features,
+                    "fingerprints": self.fingerprints,
+                },
+                tmp_path,
+            )
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
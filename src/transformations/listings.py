@@ -1,16 +1,19 @@
 import ast
+import json
 import re
+from collections.abc import Iterator
+from pathlib import Path
 
-import contractions
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
-from haversine import haversine
-from textblob import TextBlob
+from scipy import sparse
 
 from src.transformations.features import AMENITIES, INITIAL_FEATURES
+from src.transformations.sentiment import SentimentEngine, convert_text_to_sentiment
 
 CENTRE_LAT = 37.9755
 CENTRE_LON = 23.7349
+EARTH_RADIUS_KM = 6371.0088
 
 
 def _normalize_text(text: str) -> str:
@@ -20,13 +23,35 @@ def _normalize_text(text: str) -> str:
     return text
 
 
-def add_distance_to_centre_attribute(df: pd.DataFrame):
-    def _compute_distance(row):
-        lat = row.get("latitude")
-        lon = row.get("longitude")
-        return haversine((float(lat), float(lon)), (CENTRE_LAT, CENTRE_LON))
+def _map_categories(series: pd.Series, func) -> pd.Series:
+    mapped = series.astype("category").map(func, na_action="ignore")
+    return pd.Series(np.asarray(mapped), index=series.index, name=series.name)
+
 
-    df["distance_to_centre"] = df.apply(_compute_distance, axis=1)
+def haversine_distances(
+    lat: np.ndarray, lon: np.ndarray, points: list[tuple[float, float]]
+) -> np.ndarray:
+    lat1 = np.radians(np.asarray(lat, dtype=np.float64))[:, np.newaxis]
+    lon1 = np.radians(np.asarray(lon, dtype=np.float64))[:, np.newaxis]
+    lat2, lon2 = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2)).T
+
+    d = (
+        np.sin((lat2 - lat1) * 0.5) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(d))
+
+
+def add_distance_attributes(df: pd.DataFrame, points: dict[str, tuple[float, float]]):
+    distances = haversine_distances(
+        df["latitude"], df["longitude"], list(points.values())
+    )
+    for i, name in enumerate(points):
+        df[f"distance_to_{name}"] = distances[:, i]
+
+
+def add_distance_to_centre_attribute(df: pd.DataFrame):
+    add_distance_attributes(df, {"centre": (CENTRE_LAT, CENTRE_LON)})
 
 
 def add_is_luxury_attribute(df: pd.DataFrame):
@@ -36,7 +61,7 @@ def add_is_luxury_attribute(df: pd.DataFrame):
             return 1
         return 0
 
-    new_columns = df["property_type"].map(is_luxury, na_action="ignore").astype("Int64")
+    new_columns = _map_categories(df["property_type"], is_luxury).astype("Int64")
     df["is_luxury"] = new_columns
 
 
@@ -53,9 +78,7 @@ def aggregate_property_type(df: pd.DataFrame):
             return "hotel"
         return "other"
 
-    df["property_type"] = df["property_type"].map(
-        map_proprerty_type, na_action="ignore"
-    )
+    df["property_type"] = _map_categories(df["property_type"], map_proprerty_type)
 
 
 def fill_bathrooms_values_from_text(df: pd.DataFrame):
@@ -72,51 +95,109 @@ def add_is_bathroom_shared_attribute(df: pd.DataFrame):
             return 1
         return 0
 
-    new_columns = (
-        df["bathrooms_text"].map(is_shared, na_action="ignore").astype("Int64")
-    )
+    new_columns = _map_categories(df["bathrooms_text"], is_shared).astype("Int64")
     df["is_bathroom_shared"] = new_columns
 
 
-def convert_text_to_sentiment(text: str) -> float:
-    soup = BeautifulSoup(text, "html.parser")
-    text = soup.get_text()
+def _text_to_sentiment(
+    texts: pd.Series, engine: SentimentEngine | None = None
+) -> pd.Series:
+    if engine is None:
+        return texts.map(convert_text_to_sentiment, na_action="ignore")
+    return engine.score(texts)
 
-    text = contractions.fix(text)
 
-    text = re.sub(r"[^\w\s!?-]", "", text)
-    text = text.lower()
+def convert_description_to_sentiment(
+    df: pd.DataFrame, engine: SentimentEngine | None = None
+):
+    df["description_sentiment"] = _text_to_sentiment(df["description"], engine)
 
-    blob = TextBlob(text)
-    return float(blob.sentiment.polarity)
 
+def convert_neighborhood_overview_to_sentiment(
+    df: pd.DataFrame, engine: SentimentEngine | None = None
+):
+    sentiment = _text_to_sentiment(df["neighborhood_overview"], engine)
+    df["neighborhood_overview_sentiment"] = sentiment
 
-def convert_description_to_sentiment(df: pd.DataFrame):
-    sentiment = df["description"].map(convert_text_to_sentiment, na_action="ignore")
-    df["description_sentiment"] = sentiment
 
+class AmenityMatrix:
+    def __init__(
+        self,
+        vocabulary: list[str],
+        matrix: sparse.csr_matrix,
+        counts: np.ndarray,
+        index: pd.Index,
+    ) -> None:
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+        self.counts = counts
+        self.index = index
+        self._positions = {key: i for i, key in enumerate(vocabulary)}
+
+    def column(self, amenity: str) -> np.ndarray:
+        position = self._positions.get(_normalize_text(amenity))
+        if position is None:
+            return np.zeros(self.matrix.shape[0], dtype=np.uint8)
+        return self.matrix[:, position].toarray().ravel()
+
+    def frequencies(self) -> pd.Series:
+        return pd.Series(
+            np.asarray(self.matrix.sum(axis=0)).ravel(), index=self.vocabulary
+        )
 
-def convert_neighborhood_overview_to_sentiment(df: pd.DataFrame):
-    sentiment = df["neighborhood_overview"].map(
-        convert_text_to_sentiment, na_action="ignore"
-    )
-    df["neighborhood_overview_sentiment"] = sentiment
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame.sparse.from_spmatrix(
+            self.matrix, columns=self.vocabulary, index=self.index
+        )
 
 
-def add_amenity_count_attribute(df: pd.DataFrame):
-    df["amenity_count"] = df["amenities"].apply(
-        lambda x: len([a.strip().lower() for a in ast.literal_eval(x)])
-        if pd.notna(x) and x.startswith("[")
-        else 0
+def _decode_amenities(value) -> list[str]:
+    if not isinstance(value, str) or not value.startswith("["):
+        return []
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return ast.literal_eval(value)
+
+
+def parse_amenities(amenities: pd.Series) -> AmenityMatrix:
+    vocabulary: dict[str, int] = {}
+    normalized: dict[str, int] = {}
+    indptr = [0]
+    indices = []
+    counts = np.zeros(len(amenities), dtype=np.int64)
+
+    for row, value in enumerate(amenities):
+        items = _decode_amenities(value)
+        counts[row] = len(items)
+        columns = set()
+        for item in items:
+            column = normalized.get(item)
+            if column is None:
+                key = _normalize_text(item)
+                column = normalized[item] = vocabulary.setdefault(key, len(vocabulary))
+            columns.add(column)
+        indices.extend(sorted(columns))
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.uint8), indices, indptr),
+        shape=(len(amenities), len(vocabulary)),
     )
+    return AmenityMatrix(list(vocabulary), matrix, counts, amenities.index)
 
 
-def encode_amenities_binary(df: pd.DataFrame, amenities: list[str]):
-    temp_amenities = df["amenities"].apply(
-        lambda x: set(_normalize_text(a) for a in ast.literal_eval(x))
-        if pd.notna(x) and isinstance(x, str) and x.startswith("[")
-        else set()
-    )
+def add_amenity_count_attribute(df: pd.DataFrame, parsed: AmenityMatrix | None = None):
+    if parsed is None:
+        parsed = parse_amenities(df["amenities"])
+    df["amenity_count"] = parsed.counts
+
+
+def encode_amenities_binary(
+    df: pd.DataFrame, amenities: list[str], parsed: AmenityMatrix | None = None
+):
+    if parsed is None:
+        parsed = parse_amenities(df["amenities"])
 
     new_columns_data = {}
 
@@ -125,9 +206,9 @@ def encode_amenities_binary(df: pd.DataFrame, amenities: list[str]):
         clean_col_name = (
             f"amenity_{search_key.strip().replace(' ', '_').replace('/', '_').lower()}"
         )
-        new_columns_data[clean_col_name] = temp_amenities.apply(
-            lambda tags: 1 if search_key in tags else 0
-        ).astype("Int64")
+        new_columns_data[clean_col_name] = pd.array(
+            parsed.column(amenity), dtype="Int64"
+        )
 
     new_df = pd.DataFrame(new_columns_data, index=df.index)
     df[new_df.columns] = new_df
@@ -135,7 +216,7 @@ def encode_amenities_binary(df: pd.DataFrame, amenities: list[str]):
 
 def convert_percentage_columns(df: pd.DataFrame, columns: list[str]):
     for col in columns:
-        df[col] = df[col].str.strip("%").astype(float) / 100.0
+        df[col] = df[col].astype("str").str.strip("%").astype(float) / 100.0
 
 
 def convert_tf_columns(df: pd.DataFrame, columns: list[str]):
@@ -143,10 +224,12 @@ def convert_tf_columns(df: pd.DataFrame, columns: list[str]):
         return 1 if val == "t" else 0
 
     for col in columns:
-        df[col] = df[col].map(map_tf, na_action="ignore").astype("Int64")
+        df[col] = _map_categories(df[col], map_tf).astype("Int64")
 
 
-def transform_pipeline(df: pd.DataFrame) -> pd.DataFrame:
+def transform_pipeline(
+    df: pd.DataFrame, sentiment_engine: SentimentEngine | None = None
+) -> pd.DataFrame:
     percentage_attributes = ["host_response_rate", "host_acceptance_rate"]
     tf_attributes = ["host_is_superhost", "host_identity_verified", "instant_bookable"]
     drop = [
@@ -164,12 +247,59 @@ def transform_pipeline(df: pd.DataFrame) -> pd.DataFrame:
     aggregate_property_type(df)
     fill_bathrooms_values_from_text(df)
     add_is_bathroom_shared_attribute(df)
-    add_amenity_count_attribute(df)
-    encode_amenities_binary(df, AMENITIES)
-    convert_description_to_sentiment(df)
-    convert_neighborhood_overview_to_sentiment(df)
+    parsed_amenities = parse_amenities(df["amenities"])
+    add_amenity_count_attribute(df, parsed_amenities)
+    encode_amenities_binary(df, AMENITIES, parsed_amenities)
+    convert_description_to_sentiment(df, sentiment_engine)
+    convert_neighborhood_overview_to_sentiment(df, sentiment_engine)
     convert_percentage_columns(df, percentage_attributes)
     convert_tf_columns(df, tf_attributes)
     df.drop(columns=drop, inplace=True)
 
     return df
+
+
+TEXT_FEATURES = [
+    "property_type",
+    "room_type",
+    "bathrooms_text",
+    "amenities",
+    "description",
+    "neighborhood_overview",
+    "host_response_time",
+    "host_response_rate",
+    "host_acceptance_rate",
+    "host_is_superhost",
+    "host_identity_verified",
+    "instant_bookable",
+]
+FEATURE_DTYPES = {column: "str" for column in TEXT_FEATURES} | {
+    column: "float64"
+    for column in ["bathrooms", "bedrooms", "beds", "review_scores_rating"]
+}
+
+
+def transform_chunks(
+    source: str | Path,
+    chunksize: int = 10000,
+    sentiment_engine: SentimentEngine | None = None,
+) -> Iterator[pd.DataFrame]:
+    reader = pd.read_csv(
+        source, usecols=INITIAL_FEATURES, dtype=FEATURE_DTYPES, chunksize=chunksize
+    )
+    for chunk in reader:
+        yield transform_pipeline(chunk, sentiment_engine)
+
+
+def transform_csv(
+    source: str | Path,
+    destination: str | Path,
+    chunksize: int = 10000,
+    sentiment_engine: SentimentEngine | None = None,
+) -> int:
+    rows = 0
+    with open(destination, mode="w", newline="") as file_handle:
+        for features in transform_chunks(source, chunksize, sentiment_engine):
+            features.to_csv(file_handle, header=rows == 0, index=False)
+            rows += len(features)
+    return rows
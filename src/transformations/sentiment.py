@@ -0,0 +1,117 @@
+import hashlib
+import inspect
+import re
+import sqlite3
+from importlib.metadata import version
+from pathlib import Path
+
+import contractions
+import pandas as pd
+from bs4 import BeautifulSoup
+from joblib import Parallel, delayed
+from textblob import TextBlob
+
+
+def convert_text_to_sentiment(text: str) -> float:
+    soup = BeautifulSoup(text, "html.parser")
+    text = soup.get_text()
+
+    text = contractions.fix(text)
+
+    text = re.sub(r"[^\w\s!?-]", "", text)
+    text = text.lower()
+
+    blob = TextBlob(text)
+    return float(blob.sentiment.polarity)
+
+
+# Editing the scoring steps or upgrading TextBlob invalidates cached scores.
+SENTIMENT_VERSION = (
+    hashlib.sha1(inspect.getsource(convert_text_to_sentiment).encode()).hexdigest()[:12]
+    + f":textblob-{version('textblob')}"
+)
+
+
+def _score_texts(texts: list[str]) -> list[float]:
+    return [convert_text_to_sentiment(text) for text in texts]
+
+
+class SentimentEngine:
+    def __init__(
+        self,
+        cache_path: str | Path | None = ".cache/sentiment.sqlite",
+        n_jobs: int = -1,
+        chunk_size: int = 256,
+    ) -> None:
+        self.cache_path = cache_path
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self._memory: dict[str, float] = {}
+
+    def score(self, texts: pd.Series) -> pd.Series:
+        unique_texts = texts.dropna().unique().tolist()
+        keys = [self._key(text) for text in unique_texts]
+        scores = self._lookup(keys)
+
+        missing = [(k, t) for k, t in zip(keys, unique_texts) if k not in scores]
+        if missing:
+            new_scores = self._score([text for _, text in missing])
+            computed = {key: score for (key, _), score in zip(missing, new_scores)}
+            self._store(computed)
+            scores.update(computed)
+
+        mapping = {text: scores[key] for key, text in zip(keys, unique_texts)}
+        return texts.map(mapping, na_action="ignore")
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(f"{SENTIMENT_VERSION}\0{text}".encode()).hexdigest()
+
+    def _score(self, texts: list[str]) -> list[float]:
+        if self.n_jobs == 1 or len(texts) <= self.chunk_size:
+            return _score_texts(texts)
+
+        chunks = [
+            texts[i : i + self.chunk_size]
+            for i in range(0, len(texts), self.chunk_size)
+        ]
+        results = Parallel(n_jobs=self.n_jobs)(
+            delayed(_score_texts)(chunk) for chunk in chunks
+        )
+        return [score for chunk in results for score in chunk]
+
+    def _connect(self) -> sqlite3.Connection:
+        Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.cache_path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS sentiment (key TEXT PRIMARY KEY, score REAL)"
+        )
+        return connection
+
+    def _lookup(self, keys: list[str]) -> dict[str, float]:
+        if self.cache_path is None:
+            return {key: self._memory[key] for key in keys if key in self._memory}
+
+        found = {}
+        with self._connect() as connection:
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                query = (
+                    f"SELECT key, score FROM sentiment WHERE key IN ({placeholders})"
+                )
+                found.update(connection.execute(query, batch).fetchall())
+        connection.close()
+        return found
+
+    def _store(self, scores: dict[str, float]) -> None:
+        if self.cache_path is None:
+            self._memory.update(scores)
+            return
+
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO sentiment (key, score) VALUES (?, ?)",
+                scores.items(),
+            )
+        connection.close()
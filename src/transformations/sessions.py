@@ -1,9 +1,41 @@
+from collections.abc import Iterator
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 
+from src.transformations.sketches import HLL_PRECISION, ListingSketches
+
+EVENT_COLUMNS = [
+    "timestamp",
+    "listing_id",
+    "action",
+    "booking_date",
+    "booking_duration",
+]
+ACTIONS = ["view_listing", "book_listing"]
+AGGREGATE_COLUMNS = [
+    "events",
+    "views",
+    "bookings",
+    "lead_time_sum",
+    "lead_time_count",
+    "duration_sum",
+    "duration_count",
+]
+SESSION_DTYPES = {
+    "session_id": "int64",
+    "user_id": "int64",
+    "listing_id": "float64",
+    "action": "category",
+    "booking_duration": "float32",
+}
+DAY_NS = 86_400 * 10**9
+UNDATED_DAY = np.iinfo(np.int64).max
+
 
 def drop_browse_listings(df: pd.DataFrame):
-    df.loc[df["action"] != "browse_listings"]
+    df.drop(df[df["action"] == "browse_listings"].index, inplace=True)
 
 
 def convert_timestamps_to_dates(df: pd.DataFrame):
@@ -85,14 +117,228 @@ def get_average_booking_duration(df: pd.DataFrame, listings_df: pd.DataFrame):
     )
 
 
-def transform_pipeline(sdf: pd.DataFrame) -> pd.DataFrame:
-    sdf.copy()
-    drop_browse_listings(sdf)
-    convert_timestamps_to_dates(sdf)
-    drop_records_older_than_one_year(sdf)
+def _partial_aggregates(df: pd.DataFrame) -> pd.DataFrame:
+    codes, listing_ids = pd.factorize(df["listing_id"])
+    bins = codes + 1
+    size = len(listing_ids) + 1
+    actions = pd.Categorical(df["action"], categories=ACTIONS).codes
+    is_booking = actions == 1
+
+    timestamps = df["timestamp"].to_numpy("datetime64[ns]").view("i8")
+    booking_dates = df["booking_date"].to_numpy("datetime64[ns]").view("i8")
+    has_lead_time = (
+        is_booking
+        & (timestamps != np.iinfo(np.int64).min)
+        & (booking_dates != np.iinfo(np.int64).min)
+    )
+    lead_times = (
+        booking_dates[has_lead_time] - timestamps[has_lead_time] // DAY_NS * DAY_NS
+    ) // DAY_NS
+
+    durations = df["booking_duration"].to_numpy(dtype=np.float64, na_value=np.nan)
+    has_duration = is_booking & ~np.isnan(durations)
+
+    aggregates = {
+        "events": np.bincount(bins, minlength=size),
+        "views": np.bincount(bins[actions == 0], minlength=size),
+        "bookings": np.bincount(bins[is_booking], minlength=size),
+        "lead_time_sum": np.bincount(
+            bins[has_lead_time], weights=lead_times, minlength=size
+        ),
+        "lead_time_count": np.bincount(bins[has_lead_time], minlength=size),
+        "duration_sum": np.bincount(
+            bins[has_duration], weights=durations[has_duration], minlength=size
+        ),
+        "duration_count": np.bincount(bins[has_duration], minlength=size),
+    }
+    return pd.DataFrame(
+        {column: values[1:] for column, values in aggregates.items()},
+        index=pd.Index(listing_ids, name="listing_id"),
+    )
+
+
+def _combine_aggregates(partials: list[pd.DataFrame]) -> pd.DataFrame:
+    return pd.concat(partials).groupby(level=0, sort=False).sum()
+
+
+def _finalize_aggregates(aggregates: pd.DataFrame) -> pd.DataFrame:
+    def ratio(numerator: str, denominator: str) -> np.ndarray:
+        total = aggregates[denominator].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = aggregates[numerator].to_numpy() / total
+        return np.where(total > 0, values, np.nan)
+
+    return pd.DataFrame(
+        {
+            "listing_id": aggregates.index.to_numpy(),
+            "listing_views_ltm": aggregates["views"].to_numpy().astype(int),
+            "conversion_rate_ltm": ratio("bookings", "views"),
+            "average_lead_time": ratio("lead_time_sum", "lead_time_count"),
+            "average_booking_duration": ratio("duration_sum", "duration_count"),
+        }
+    )
+
+
+def _update_viewer_sketches(sketches: ListingSketches, df: pd.DataFrame):
+    views = df.loc[df["action"] == "view_listing", ["listing_id", "user_id"]]
+    sketches.update(views["listing_id"], views["user_id"])
+
+
+def add_unique_viewers_attribute(listings_df: pd.DataFrame, sketches: ListingSketches):
+    listings_df["unique_viewers_ltm"] = (
+        listings_df["listing_id"].map(sketches.estimate()).fillna(0).astype(int)
+    )
+
+
+def transform_pipeline(
+    sdf: pd.DataFrame, unique_viewers: bool = False, precision: int = HLL_PRECISION
+) -> pd.DataFrame:
+    columns = EVENT_COLUMNS + ["user_id"] if unique_viewers else EVENT_COLUMNS
+    events = sdf.loc[sdf["action"] != "browse_listings", columns].copy()
+    convert_timestamps_to_dates(events)
+    drop_records_older_than_one_year(events)
+    ldf = _finalize_aggregates(_partial_aggregates(events))
 
-    ldf = get_views_last(sdf)
-    get_conversion_rate(sdf, ldf)
-    get_average_lead_time(sdf, ldf)
-    get_average_booking_duration(sdf, ldf)
+    if unique_viewers:
+        sketches = ListingSketches(precision)
+        _update_viewer_sketches(sketches, events)
+        add_unique_viewers_attribute(ldf, sketches)
     return ldf
+
+
+def read_session_chunks(
+    source: str | Path,
+    chunksize: int = 1_000_000,
+    columns: list[str] = EVENT_COLUMNS,
+) -> Iterator[pd.DataFrame]:
+    dtypes = {
+        column: SESSION_DTYPES[column] for column in columns if column in SESSION_DTYPES
+    }
+    reader = pd.read_csv(source, usecols=columns, dtype=dtypes, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk.loc[chunk["action"] != "browse_listings"]
+        if "booking_date" in chunk:
+            convert_timestamps_to_dates(chunk)
+        else:
+            chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], errors="coerce")
+        yield chunk
+
+
+def aggregate_csv(
+    source: str | Path,
+    chunksize: int = 1_000_000,
+    latest: pd.Timestamp | None = None,
+    unique_viewers: bool = False,
+    precision: int = HLL_PRECISION,
+) -> pd.DataFrame:
+    if latest is None:
+        latest = max(
+            chunk["timestamp"].max()
+            for chunk in read_session_chunks(source, chunksize, ["timestamp", "action"])
+        )
+    threshold = latest - pd.Timedelta(days=365)
+
+    columns = EVENT_COLUMNS + ["user_id"] if unique_viewers else EVENT_COLUMNS
+    aggregates = _partial_aggregates(pd.DataFrame(columns=EVENT_COLUMNS))
+    sketches = ListingSketches(precision)
+    for chunk in read_session_chunks(source, chunksize, columns):
+        chunk = chunk.loc[~(chunk["timestamp"] < threshold)]
+        aggregates = _combine_aggregates([aggregates, _partial_aggregates(chunk)])
+        if unique_viewers:
+            _update_viewer_sketches(sketches, chunk)
+
+    ldf = _finalize_aggregates(aggregates)
+    if unique_viewers:
+        add_unique_viewers_attribute(ldf, sketches)
+    return ldf
+
+
+class RollingSessionAggregator:
+    def __init__(self, window_days: int = 365) -> None:
+        self.window_days = window_days
+        # Buckets hold the aggregates of days after the boundary day, which are
+        # fully inside the window. Raw events are kept per day, because the day
+        # that contains latest - window is cut at the exact timestamp.
+        self.buckets: dict[int, pd.DataFrame] = {}
+        self.day_events: dict[int, pd.DataFrame] = {}
+        self.totals = _partial_aggregates(pd.DataFrame(columns=EVENT_COLUMNS))
+        self.latest = None
+
+    @property
+    def threshold(self) -> int | None:
+        if self.latest is None:
+            return None
+        return self.latest - self.window_days * DAY_NS
+
+    @property
+    def first_day(self) -> int | None:
+        threshold = self.threshold
+        return None if threshold is None else threshold // DAY_NS
+
+    def update(self, sdf: pd.DataFrame) -> None:
+        events = sdf.loc[sdf["action"] != "browse_listings", EVENT_COLUMNS].copy()
+        convert_timestamps_to_dates(events)
+
+        timestamps = events["timestamp"].to_numpy("datetime64[ns]").view("i8")
+        dated = timestamps != np.iinfo(np.int64).min
+        if dated.any():
+            latest = int(timestamps[dated].max())
+            self.latest = latest if self.latest is None else max(self.latest, latest)
+
+        threshold, first_day = self.threshold, self.first_day
+        if threshold is not None:
+            keep = ~dated | (timestamps >= threshold)
+            events, timestamps, dated = events.loc[keep], timestamps[keep], dated[keep]
+        days = np.where(dated, timestamps // DAY_NS, UNDATED_DAY)
+
+        events["action"] = pd.Categorical(events["action"], categories=ACTIONS)
+        changes = [self.totals]
+        for day, group in events.groupby(days):
+            if day != UNDATED_DAY:
+                stored = self.day_events.get(day)
+                self.day_events[day] = (
+                    group if stored is None else pd.concat([stored, group])
+                )
+            if day == first_day:
+                continue
+            partial = _partial_aggregates(group)
+            if day in self.buckets:
+                self.buckets[day] = _combine_aggregates([self.buckets[day], partial])
+            else:
+                self.buckets[day] = partial
+            changes.append(partial)
+
+        for day in sorted(self.buckets):
+            if first_day is None or day > first_day:
+                break
+            changes.append(-self.buckets.pop(day))
+        if first_day is not None:
+            for day in [day for day in self.day_events if day < first_day]:
+                del self.day_events[day]
+        if first_day in self.day_events:
+            boundary = self.day_events[first_day]
+            self.day_events[first_day] = boundary.loc[
+                boundary["timestamp"] >= pd.Timestamp(threshold)
+            ]
+
+        totals = _combine_aggregates(changes)
+        self.totals = totals.loc[totals["events"] > 0]
+
+    def result(self) -> pd.DataFrame:
+        boundary = self.day_events.get(self.first_day)
+        if boundary is None or boundary.empty:
+            return _finalize_aggregates(self.totals)
+        return _finalize_aggregates(
+            _combine_aggregates([self.totals, _partial_aggregates(boundary)])
+        )
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        pd.to_pickle(self, tmp_path)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "RollingSessionAggregator":
+        return pd.read_pickle(path)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+HLL_PRECISION = 10
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+
+
+class ListingSketches:
+    def __init__(self, precision: int = HLL_PRECISION) -> None:
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.listing_ids = pd.Index([], dtype="float64", name="listing_id")
+        self.registers = np.zeros((0, 1 << precision), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.listing_ids)
+
+    def update(self, listing_ids, user_ids) -> "ListingSketches":
+        listing_ids = np.asarray(listing_ids)
+        valid = ~pd.isna(listing_ids)
+        listing_ids = listing_ids[valid]
+        hashes = pd.util.hash_array(np.asarray(user_ids)[valid])
+
+        rows = self._rows(pd.unique(listing_ids)).get_indexer(listing_ids)
+        buckets = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        remainder = hashes << np.uint64(self.precision)
+        ranks = np.minimum(64 - _bit_length(remainder), 64 - self.precision) + 1
+        np.maximum.at(self.registers, (rows, buckets), ranks.astype(np.uint8))
+        return self
+
+    def merge(self, other: "ListingSketches") -> "ListingSketches":
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        rows = self._rows(other.listing_ids).get_indexer(other.listing_ids)
+        np.maximum.at(self.registers, rows, other.registers)
+        return self
+
+    def estimate(self) -> pd.Series:
+        m = self.registers.shape[1]
+        alpha = 0.7213 / (1 + 1.079 / m)
+        harmonic = np.ldexp(1.0, -self.registers.astype(np.int64)).sum(axis=1)
+        raw = alpha * m * m / harmonic
+
+        zeros = (self.registers == 0).sum(axis=1)
+        with np.errstate(divide="ignore"):
+            linear = m * np.log(m / zeros)
+        counts = np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+        return pd.Series(np.rint(counts).astype(int), index=self.listing_ids)
+
+    def _rows(self, listing_ids) -> pd.Index:
+        new = pd.Index(listing_ids).difference(self.listing_ids, sort=False)
+        if len(new):
+            self.listing_ids = self.listing_ids.append(new).rename("listing_id")
+            self.registers = np.vstack(
+                [
+                    self.registers,
+                    np.zeros((len(new), self.registers.shape[1]), np.uint8),
+                ]
+            )
+        return self.listing_ids
@@ -1,45 +1,35 @@
-import ast
 from collections import Counter
 from typing import Counter as CounterType
 
+import numpy as np
 import pandas as pd
 from sklearn.feature_selection import mutual_info_regression
-from sklearn.preprocessing import MultiLabelBinarizer
 
+from src.transformations.listings import AmenityMatrix, parse_amenities
 
-def _extract_amenities_list(df: pd.DataFrame) -> pd.Series:
-    amenities_list = df["amenities"].apply(
-        lambda x: [a.strip().lower() for a in ast.literal_eval(x)]
-        if pd.notna(x) and x.startswith("[")
-        else []
-    )
-    return amenities_list
 
+def _frequent_amenities(
+    parsed: AmenityMatrix, min_freq: int
+) -> tuple[list[str], np.ndarray, pd.Series]:
+    counts = parsed.frequencies()
+    positions = np.flatnonzero(counts.to_numpy() >= min_freq)
+    return counts.index[positions].tolist(), positions, counts
 
-def get_amenities_counter(df: pd.DataFrame) -> CounterType[str]:
-    amenities_list = _extract_amenities_list(df)
 
-    all_amenities = sum(amenities_list, [])
-    return Counter(all_amenities)
+def get_amenities_counter(df: pd.DataFrame) -> CounterType[str]:
+    return Counter(parse_amenities(df["amenities"]).frequencies().to_dict())
 
 
 def calc_amenities_correlation(
     df: pd.DataFrame, price: pd.Series, min_freq: int = 10
 ) -> pd.Series:
-    amenities_list = _extract_amenities_list(df)
+    parsed = parse_amenities(df["amenities"])
+    columns, positions, _ = _frequent_amenities(parsed, min_freq)
 
-    mlb = MultiLabelBinarizer(sparse_output=True)
-    amenities_matrix = mlb.fit_transform(amenities_list)
-
-    amenities_df = pd.DataFrame.sparse.from_spmatrix(
-        amenities_matrix, columns=mlb.classes_, index=df.index
+    amenities_df = pd.DataFrame(
+        parsed.matrix[:, positions].toarray(), columns=columns, index=df.index
     )
-
-    counts = amenities_df.sum()
-    valid_cols = counts[counts >= min_freq].index
-    amenities_df = amenities_df[valid_cols]
-
-    correlation = amenities_df.sparse.to_dense().corrwith(price, method="pearson")
+    correlation = amenities_df.corrwith(price, method="pearson")
 
     return correlation.sort_values(ascending=False)
 
@@ -47,38 +37,28 @@ def calc_amenities_correlation(
 def calc_amenities_mutual_info(
     df: pd.DataFrame, price: pd.Series, min_freq: int = 50
 ) -> pd.DataFrame:
-    amenities_list = _extract_amenities_list(df)
-
-    mlb = MultiLabelBinarizer(sparse_output=True)
-    amenities_matrix = mlb.fit_transform(amenities_list)
-    amenities_df = pd.DataFrame.sparse.from_spmatrix(
-        amenities_matrix, columns=mlb.classes_, index=df.index
-    )
-
-    counts = amenities_df.sum()
-    valid_cols = counts[counts >= min_freq].index
-    X = amenities_df[valid_cols]
+    parsed = parse_amenities(df["amenities"])
+    columns, positions, counts = _frequent_amenities(parsed, min_freq)
+    X = parsed.matrix[:, positions].tocsc()
 
     mi_scores = mutual_info_regression(
         X, price, discrete_features=True, random_state=42
     )
 
-    results = []
-    for idx, col in enumerate(X.columns):
-        has_amenity = X[col] == 1
-        mean_diff = price[has_amenity].mean() - price[~has_amenity].mean()
-
-        results.append(
-            {
-                "amenity": col,
-                "mutual_info": mi_scores[idx],
-                "price_diff": mean_diff,
-                "count": counts[col],
-            }
-        )
-
-    return (
-        pd.DataFrame(results)
-        .sort_values(by="mutual_info", ascending=False)
-        .set_index("amenity")
+    valid = price.notna().to_numpy().astype(np.float64)
+    values = price.fillna(0.0).to_numpy(dtype=np.float64)
+    with_sum = X.T @ values
+    with_count = X.T @ valid
+    mean_with = with_sum / with_count
+    mean_without = (values.sum() - with_sum) / (valid.sum() - with_count)
+
+    results = pd.DataFrame(
+        {
+            "amenity": columns,
+            "mutual_info": mi_scores,
+            "price_diff": mean_with - mean_without,
+            "count": counts.iloc[positions].to_numpy(),
+        }
     )
+
+    return results.sort_values(by="mutual_info", ascending=False).set_index("amenity")